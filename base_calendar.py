@@ -0,0 +1,269 @@
+from datetime import datetime, timedelta
+from functools import lru_cache
+import os
+import resvg_py
+
+
+# SVGのスタイルシート（全ての呼び出しで共通）
+_STYLE_BLOCK = '''    <defs>
+        <style>
+            .header { font-family: Arial, sans-serif; font-size: 16px; font-weight: bold; text-anchor: middle; }
+            .date { font-family: Arial, sans-serif; font-size: 14px; text-anchor: middle; }
+            .month { font-family: Arial, sans-serif; font-size: 18px; font-weight: bold; text-anchor: start; }
+            .day-number { font-family: Arial, sans-serif; font-size: 14px; text-anchor: end; }
+            .event { font-family: Arial, sans-serif; font-size: 10px; text-anchor: start; }
+            .event-rect { stroke: #666666; stroke-width: 0.5; }
+            .cell { fill: white; stroke: #cccccc; stroke-width: 1; }
+            .saturday { fill: #e3f2fd; }
+            .sunday { fill: #ffebee; }
+            .today { fill: #ffffa8; stroke: #cccccc; stroke-width: 1; }
+        </style>
+    </defs>
+'''
+
+# 週の各曜日（月曜日からの日数）のオフセット
+_DAY_OFFSETS = tuple(timedelta(days=i) for i in range(7))
+
+# 曜日ごとのセルのクラス
+_DEFAULT_CLASS = ('cell', 'cell', 'cell', 'cell', 'cell', 'cell saturday', 'cell sunday')
+
+# XMLエスケープ用の変換テーブル
+_XML_TT = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;'})
+
+# PNG変換の標準の解像度（これ以外の解像度のPNGはファイル名に解像度を付ける）
+_DEFAULT_DPI = 300
+
+# PNG変換で sans-serif に割り当てるフォントの候補（日本語を表示できるものを優先）
+_SANS_SERIF_CANDIDATES = (
+    'Noto Sans CJK JP', 'Noto Sans JP', 'Source Han Sans JP', 'IPAexGothic', 'IPAGothic',
+    'Hiragino Sans', 'Hiragino Kaku Gothic ProN', 'Yu Gothic', 'Meiryo', 'MS Gothic',
+    'TakaoGothic', 'VL Gothic', 'Arial', 'Liberation Sans', 'DejaVu Sans',
+)
+
+
+@lru_cache(maxsize=None)
+def _column_coords(cell_width, margin):
+    """列方向の座標（セル左端・中央・日付・月表示のx座標）を計算"""
+    xs = tuple(margin + i * cell_width for i in range(7))
+    x_text_centers = tuple(x + cell_width // 2 for x in xs)
+    x_day_num = tuple(x + cell_width - 8 for x in xs)
+    x_month = tuple(x + 8 for x in xs)
+    return xs, x_text_centers, x_day_num, x_month
+
+
+@lru_cache(maxsize=None)
+def _row_coords(cell_height, header_height, margin):
+    """行方向の座標（4週分のセル上端・日付のy座標）を計算"""
+    ys = tuple(margin + header_height + i * cell_height for i in range(4))
+    y_day_text = tuple(y + 20 for y in ys)
+    return ys, y_day_text
+
+
+@lru_cache(maxsize=None)
+def _weekday_header(week_days, cell_width, header_height, margin):
+    """曜日ヘッダーのSVG要素を生成"""
+    xs, x_text_centers, _, _ = _column_coords(cell_width, margin)
+    y_offset = margin
+    y_header_text = y_offset + header_height // 2 + 5
+    header_parts = []
+    for i, day_name in enumerate(week_days):
+        header_parts.append(f'''
+    <!-- 曜日ヘッダー: {day_name} -->
+    <rect x="{xs[i]}" y="{y_offset}" width="{cell_width}" height="{header_height}" 
+          class="cell" fill="#e0e0e0"/>
+    <text x="{x_text_centers[i]}" y="{y_header_text}" 
+          class="header">{day_name}</text>''')
+    return ''.join(header_parts).encode('utf-8')
+
+
+@lru_cache(maxsize=16)
+def _prelude(total_width, total_height):
+    """SVGの冒頭部分（XML宣言・スタイル・背景）を生成"""
+    return f'''<?xml version="1.0" encoding="UTF-8"?>
+<svg width="{total_width}" height="{total_height}" xmlns="http://www.w3.org/2000/svg">
+{_STYLE_BLOCK}    
+    <!-- 背景 -->
+    <rect width="{total_width}" height="{total_height}" fill="#fafafa"/>
+'''.encode('utf-8')
+
+
+def _renders_glyph(family, text):
+    """resvgで指定したフォントがtextのグリフを描画できるか判定"""
+    def render(content):
+        svg = (f'<svg xmlns="http://www.w3.org/2000/svg" width="40" height="24">'
+               f'<text x="2" y="18" font-family="{family}" font-size="16">{content}</text></svg>')
+        return resvg_py.svg_to_bytes(svg_string=svg, sans_serif_family=family)
+    # フォントがない場合は何も描画されず、グリフがない場合は未定義グリフ（豆腐）と同じ描画になる
+    return render(text) != render('\U000F0000')
+
+
+@lru_cache(maxsize=None)
+def _sans_serif_family():
+    """PNG変換で sans-serif として使うインストール済みのフォントを選ぶ（見つからない場合はNone）"""
+    for text in ('月', 'A'):
+        for family in _SANS_SERIF_CANDIDATES:
+            if _renders_glyph(family, text):
+                return family
+    return None
+
+
+class BaseCalendarSVGGenerator:
+    """4週間カレンダーのSVG生成の共通部分（日付範囲・座標・セル描画・PNG変換）"""
+    
+    # セルのSVGテンプレート
+    _CELL_TMPL = '''
+    <!-- {d} -->
+    <rect x="{x}" y="{y}" width="{w}" height="{h}" 
+          class="{cls}"/>
+    {month}
+    <text x="{tx}" y="{ty}" 
+          class="day-number">{dn}</text>'''
+    
+    def __init__(self, cell_width=120, cell_height=140, header_height=40, margin=10):
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.header_height = header_height
+        self.margin = margin
+        self.week_days = ['月', '火', '水', '木', '金', '土', '日']
+        self._buf = bytearray()  # generate_svg の出力バッファ（呼び出し間で再利用）
+        self._default_class = _DEFAULT_CLASS
+        self._xml_tt = _XML_TT
+        
+        # 列方向の座標と曜日ヘッダーはセルの高さに依存しないので、同じ寸法のインスタンス間で共有
+        self._xs, self._x_text_centers, self._x_day_num, self._x_month = _column_coords(cell_width, margin)
+        self._weekday_header = _weekday_header(tuple(self.week_days), cell_width, header_height, margin)
+    
+    def get_week_range(self, target_date):
+        """指定された日付を含む週の月曜日から日曜日までの日付を取得"""
+        # 月曜日を週の始まりとする（0=月曜日）
+        days_since_monday = target_date.weekday()
+        monday = target_date - timedelta(days=days_since_monday)
+        
+        return [monday + offset for offset in _DAY_OFFSETS]
+    
+    def get_four_week_range(self, today=None):
+        """当日の週を含む4週間の日付範囲を取得（前1週間+当週+後2週間）"""
+        if today is None:
+            today = datetime.now().date()
+        
+        # 当日の週を取得
+        current_week = self.get_week_range(today)
+        
+        # 前の週
+        prev_week_start = current_week[0] - timedelta(days=7)
+        prev_week = self.get_week_range(prev_week_start)
+        
+        # 後の2週間
+        next_week1_start = current_week[0] + timedelta(days=7)
+        next_week1 = self.get_week_range(next_week1_start)
+        
+        next_week2_start = current_week[0] + timedelta(days=14)
+        next_week2 = self.get_week_range(next_week2_start)
+        
+        # 4週間分の日付をまとめる
+        all_weeks = [prev_week, current_week, next_week1, next_week2]
+        return all_weeks, today
+    
+    def _start_svg(self):
+        """出力バッファを冒頭部分と曜日ヘッダーで初期化し、行方向の座標を返す"""
+        # SVGの全体サイズを計算
+        total_width = 7 * self.cell_width + 2 * self.margin
+        total_height = self.header_height + 4 * self.cell_height + 2 * self.margin  # ヘッダー行 + 4週間
+        
+        buf = self._buf
+        buf.clear()
+        buf += _prelude(total_width, total_height)
+        
+        # 曜日ヘッダーを描画
+        buf += self._weekday_header
+        
+        return _row_coords(self.cell_height, self.header_height, self.margin)
+    
+    def _cell_fragment(self, date, day_idx, y, y_text, today_date):
+        """1日分のセルのSVG要素を生成"""
+        # セルのスタイルを決定
+        cell_class = 'cell today' if date == today_date else self._default_class[day_idx]
+        
+        # 月表示の判定（毎月1日のみ）
+        month_text = ""
+        if date.day == 1:
+            month_text = f'<text x="{self._x_month[day_idx]}" y="{y_text}" class="month">{date.month}月</text>'
+        
+        return self._CELL_TMPL.format_map({
+            'd': date.isoformat(), 'x': self._xs[day_idx], 'y': y, 'w': self.cell_width, 'h': self.cell_height,
+            'cls': cell_class, 'month': month_text, 'tx': self._x_day_num[day_idx], 'ty': y_text,
+            'dn': date.day,
+        })
+    
+    def _finish_svg(self, output_file):
+        """SVGを閉じてファイルに書き込む"""
+        buf = self._buf
+        buf += b'''
+</svg>'''
+        
+        # ファイルに書き込み（UTF-8のバイト列をそのまま出力）
+        self._write_if_changed(output_file, buf)
+    
+    def generate_svg(self, output_file="calendar.svg", today=None):
+        """予定なしの4週間のカレンダーSVGを生成"""
+        weeks, today_date = self.get_four_week_range(today)
+        ys, y_day_text = self._start_svg()
+        
+        cell_parts = []
+        for week_idx, week in enumerate(weeks):
+            y = ys[week_idx]
+            y_text = y_day_text[week_idx]
+            for day_idx, date in enumerate(week):
+                cell_parts.append(self._cell_fragment(date, day_idx, y, y_text, today_date))
+        self._buf += ''.join(cell_parts).encode('utf-8')
+        
+        self._finish_svg(output_file)
+        return output_file
+    
+    def _write_if_changed(self, output_file, data):
+        """内容が変わった場合のみファイルに書き込む（PNG変換のスキップ判定に更新日時を使うため）"""
+        try:
+            with open(output_file, 'rb') as f:
+                if f.read() == data:
+                    return
+        except OSError:
+            pass
+        with open(output_file, 'wb') as f:
+            f.write(data)
+    
+    def convert_svg_to_png(self, svg_file, dpi=_DEFAULT_DPI):
+        """SVGファイルをPNGに変換（resvgを使用）"""
+        # 解像度ごとに別のファイルにして、下書き用の低解像度PNGを標準のPNGとして再利用しないようにする
+        if dpi == _DEFAULT_DPI:
+            png_file = svg_file.replace('.svg', '.png')
+        else:
+            png_file = svg_file.replace('.svg', f'_{dpi}dpi.png')
+        
+        # PNGがSVGより新しければ変換をスキップ
+        if os.path.exists(png_file) and os.path.getmtime(png_file) >= os.path.getmtime(svg_file):
+            print(f"PNGは最新のため変換をスキップ: {png_file}")
+            return png_file
+        
+        try:
+            # resvgでSVGをPNGに変換（72dpiを等倍として拡大）
+            # resvgは sans-serif をArialとして扱うため、インストール済みのフォントを明示する
+            png_bytes = resvg_py.svg_to_bytes(svg_path=svg_file, zoom=dpi / 72,
+                                              sans_serif_family=_sans_serif_family())
+            with open(png_file, 'wb') as f:
+                f.write(png_bytes)
+            print(f"PNG変換成功: {png_file}")
+            return png_file
+        
+        except Exception as e:
+            print(f"resvg PNG変換エラー: {e}")
+            return None
+    
+    def print_date_info(self, today=None):
+        """デバッグ用：日付情報を表示"""
+        weeks, today_date = self.get_four_week_range(today)
+        print(f"基準日: {today_date}")
+        print(f"4週間の日付範囲:")
+        
+        for week_idx, week in enumerate(weeks):
+            week_type = ["前週", "当週", "次週1", "次週2"][week_idx]
+            print(f"  {week_type}: {week[0]} ～ {week[-1]}")
@@ -1,99 +1,108 @@
-from datetime import datetime, timedelta
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date
+from itertools import accumulate
 import csv
-import pyvips
+import heapq
+import json
+import os
 
+from base_calendar import BaseCalendarSVGGenerator
 
-class CalendarSVGGenerator:
+
+def _parse_date(text, _date=date, _int=int):
+    """YYYY/MM/DD形式の文字列をdateに変換（strptimeより高速）"""
+    year, month, day = text.split('/', 2)
+    return _date(_int(year), _int(month), _int(day))
+
+
+class CalendarSVGGenerator(BaseCalendarSVGGenerator):
+    # 予定の帯のSVGテンプレート
+    _EVENT_TMPL = '''
+    <rect x="{x}" y="{y}" width="{w}" height="{h}" 
+          fill="{c}" class="event-rect"/>
+    {t}'''
+    
     def __init__(self, cell_width=120, cell_height=140, header_height=40, margin=10, event_height=18):
-        self.cell_width = cell_width
-        self.cell_height = cell_height
-        self.header_height = header_height
-        self.margin = margin
+        super().__init__(cell_width, cell_height, header_height, margin)
         self.event_height = event_height
-        self.week_days = ['月', '火', '水', '木', '金', '土', '日']
         self.member_colors = {}
         self.events = []
-        
-    def get_week_range(self, target_date):
-        """指定された日付を含む週の月曜日から日曜日までの日付を取得"""
-        # 月曜日を週の始まりとする（0=月曜日）
-        days_since_monday = target_date.weekday()
-        monday = target_date - timedelta(days=days_since_monday)
-        
-        week_dates = []
-        for i in range(7):
-            week_dates.append(monday + timedelta(days=i))
-        
-        return week_dates
-    
-    def get_four_week_range(self, today=None):
-        """当日の週を含む4週間の日付範囲を取得（前1週間+当週+後2週間）"""
-        if today is None:
-            today = datetime.now().date()
-        
-        # 当日の週を取得
-        current_week = self.get_week_range(today)
-        
-        # 前の週
-        prev_week_start = current_week[0] - timedelta(days=7)
-        prev_week = self.get_week_range(prev_week_start)
-        
-        # 後の2週間
-        next_week1_start = current_week[0] + timedelta(days=7)
-        next_week1 = self.get_week_range(next_week1_start)
-        
-        next_week2_start = current_week[0] + timedelta(days=14)
-        next_week2 = self.get_week_range(next_week2_start)
-        
-        # 4週間分の日付をまとめる
-        all_weeks = [prev_week, current_week, next_week1, next_week2]
-        return all_weeks, today
+        self._start_ords = ()  # self.events と同じ順の開始日（序数）
+        self._end_ords = ()  # self.events と同じ順の終了日（序数）
+        self._max_end_ords = ()  # 先頭から各位置までの終了日（序数）の最大値
+        self._svg_cache = {}  # 入力が同じ場合に再利用する生成済みSVG（古いものから削除）
+        self._svg_cache_size = 4
     
     def load_events_from_csv(self, csv_file):
-        """CSVファイルから予定を読み込む"""
-        raw_events = []
-        members = set()
-        
+        """CSVファイルから予定を読み込む（解析結果はキャッシュファイルに保存して再利用）"""
         try:
-            with open(csv_file, 'r', encoding='utf-8') as f:
-                reader = csv.reader(f)
-                next(reader)  # ヘッダー行をスキップ
-                
-                for row in reader:
-                    if len(row) >= 4:
-                        start_date = datetime.strptime(row[0], '%Y/%m/%d').date()
-                        end_date = datetime.strptime(row[1], '%Y/%m/%d').date()
-                        member = row[2]
-                        description = row[3]
-                        
-                        raw_events.append({
-                            'start_date': start_date,
-                            'end_date': end_date,
-                            'member': member,
-                            'description': description
-                        })
-                        members.add(member)
+            stat = os.stat(csv_file)
         except FileNotFoundError:
             print(f"Warning: {csv_file} not found")
             return
         
-        # 同じ人で同じ期間の重複を削除（最後のデータを保持）
-        self.events = self.remove_duplicate_events(raw_events)
+        cache_file = csv_file + '.cache'
+        events = self._load_events_cache(cache_file, stat)
+        if events is None:
+            events = self._parse_events_csv(csv_file)
+            self._save_events_cache(cache_file, stat, events)
+        self.events = events
+        self.index_events()
         
         # メンバーの一覧を取得して色を割り当て
-        unique_members = sorted(list(members))  # ソートして一定の順序に
+        unique_members = sorted({event['member'] for event in self.events})  # ソートして一定の順序に
         self.assign_member_colors(unique_members)
     
-    def remove_duplicate_events(self, events):
-        """Same person, same periodの重複を削除"""
-        # (member, start_date, end_date)をキーとして最後のイベントを保持
+    def _parse_events_csv(self, csv_file):
+        """CSVファイルを解析して予定のリストを返す"""
+        # 同じ人で同じ期間の重複は読み込みながら削除（最後のデータを保持）
         event_dict = {}
-        for event in events:
-            key = (event['member'], event['start_date'], event['end_date'])
-            event_dict[key] = event  # 同じキーの場合、後のデータで上書き
+        with open(csv_file, 'r', encoding='utf-8') as f:
+            reader = csv.reader(f)
+            next(reader)  # ヘッダー行をスキップ
+            
+            for row in reader:
+                if len(row) >= 4:
+                    start_date = _parse_date(row[0])
+                    end_date = _parse_date(row[1])
+                    member = row[2]
+                    description = row[3]
+                    
+                    key = (member, start_date, end_date)
+                    event_dict[key] = {
+                        'start_date': start_date,
+                        'end_date': end_date,
+                        'member': member,
+                        'description': description
+                    }
         
         return list(event_dict.values())
     
+    def _load_events_cache(self, cache_file, csv_stat):
+        """CSVが更新されていなければキャッシュファイルから予定を読み込む（使えない場合はNone）"""
+        try:
+            with open(cache_file, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+            if (cache['mtime_ns'], cache['size']) != (csv_stat.st_mtime_ns, csv_stat.st_size):
+                return None
+            return [{'start_date': date.fromisoformat(start_date), 'end_date': date.fromisoformat(end_date),
+                     'member': member, 'description': description}
+                    for start_date, end_date, member, description in cache['events']]
+        except Exception:
+            return None
+    
+    def _save_events_cache(self, cache_file, csv_stat, events):
+        """解析済みの予定をCSVの更新日時・サイズと一緒にキャッシュファイルへ保存"""
+        rows = [(event['start_date'].isoformat(), event['end_date'].isoformat(), event['member'], event['description'])
+                for event in events]
+        try:
+            with open(cache_file, 'w', encoding='utf-8') as f:
+                json.dump({'mtime_ns': csv_stat.st_mtime_ns, 'size': csv_stat.st_size, 'events': rows},
+                          f, ensure_ascii=False)
+        except OSError as e:
+            print(f"Warning: {cache_file} を保存できませんでした: {e}")
+    
     def assign_member_colors(self, members):
         """メンバーに区別しやすい色を割り当てる"""
         # 区別しやすい色を選択（銘明度と彩度を調整）
@@ -133,229 +142,163 @@ class CalendarSVGGenerator:
         for i, member in enumerate(members):
             self.member_colors[member] = colors[i % len(colors)]
     
+    def index_events(self):
+        """日付範囲の絞り込み用に、予定を開始日順に並べて開始日・終了日を序数の配列として保持"""
+        self.events.sort(key=lambda event: event['start_date'])
+        self._start_ords = array('i', [event['start_date'].toordinal() for event in self.events])
+        self._end_ords = array('i', [event['end_date'].toordinal() for event in self.events])
+        self._max_end_ords = array('i', accumulate(self._end_ords, max))
+    
     def get_events_for_date_range(self, start_date, end_date):
         """指定された日付範囲の予定を取得"""
-        return [event for event in self.events
-                if not (event['end_date'] < start_date or event['start_date'] > end_date)]
+        start_ord = start_date.toordinal()
+        end_ord = end_date.toordinal()
+        # 範囲より後に始まる予定と、範囲より前に終わる予定だけの先頭部分は二分探索で除外
+        lo = bisect_left(self._max_end_ords, start_ord)
+        hi = bisect_right(self._start_ords, end_ord)
+        events = self.events
+        end_ords = self._end_ords
+        return [events[i] for i in range(lo, hi) if end_ords[i] >= start_ord]
     
     def calculate_event_layout(self, weeks):
-        """予定のレイアウトを計算（重複回避）"""
-        all_dates = []
-        for week in weeks:
-            all_dates.extend(week)
+        """予定のレイアウトを計算（重複回避）
         
-        start_date = all_dates[0]
-        end_date = all_dates[-1]
+        週ごとの帯のリスト（(開始曜日, 配置位置, 予定, 日数) を開始曜日・配置位置順に並べたもの）と、
+        使用した配置位置の数を返す
+        """
+        start_date = weeks[0][0]
+        end_date = weeks[-1][-1]
         
         relevant_events = self.get_events_for_date_range(start_date, end_date)
         
-        # 日付ごとのイベント配置を計算
-        date_event_positions = {}
-        for date in all_dates:
-            date_event_positions[date] = []
+        # 日付は序数（toordinal）の整数で扱う
+        start_ord = start_date.toordinal()
+        end_ord = end_date.toordinal()
         
-        for event in relevant_events:
-            # イベントの開始日から終了日まで、配置可能な位置を見つける
-            event_dates = []
-            current_date = max(event['start_date'], start_date)
-            while current_date <= min(event['end_date'], end_date):
-                event_dates.append(current_date)
-                current_date += timedelta(days=1)
-            
-            # 最適な配置位置を見つける
-            position = 0
-            while True:
-                can_place = True
-                for date in event_dates:
-                    if position < len(date_event_positions[date]) and date_event_positions[date][position] is not None:
-                        can_place = False
-                        break
-                
-                if can_place:
-                    # 配置を確定
-                    for date in event_dates:
-                        while len(date_event_positions[date]) <= position:
-                            date_event_positions[date].append(None)
-                        date_event_positions[date][position] = event
-                    event['layout_position'] = position
-                    break
-                
-                position += 1
+        # 期間内に切り詰めた (開始日, 終了日, 予定) を開始日順に並べる
+        clipped = sorted(
+            ((max(event['start_date'].toordinal(), start_ord),
+              min(event['end_date'].toordinal(), end_ord), event)
+             for event in relevant_events),
+            key=lambda item: item[0])
+        
+        # スイープライン方式で配置位置を割り当てる（空いた位置は小さい順に再利用）
+        active = []  # (終了日, 位置) のヒープ
+        free_positions = []  # 空いた位置のヒープ
+        next_position = 0
+        member_colors = self.member_colors
+        for event_start, event_end, event in clipped:
+            while active and active[0][0] < event_start:
+                heapq.heappush(free_positions, heapq.heappop(active)[1])
+            if free_positions:
+                position = heapq.heappop(free_positions)
+            else:
+                position = next_position
+                next_position += 1
+            heapq.heappush(active, (event_end, position))
+            event['layout_position'] = position
+            event['color'] = member_colors.get(event['member'], '#f0f0f0')
+        
+        # 予定を週ごとの帯に分割（週をまたぐ予定は週の初日から続けて描画）
+        week_entries = [[] for _ in weeks]
+        for event_start, event_end, event in clipped:
+            position = event['layout_position']
+            first = event_start - start_ord
+            last = event_end - start_ord
+            for week_idx in range(first // 7, last // 7 + 1):
+                week_first = week_idx * 7
+                seg_start = max(first, week_first)
+                seg_end = min(last, week_first + 6)
+                week_entries[week_idx].append(
+                    (seg_start - week_first, position, event, seg_end - seg_start + 1))
+        for entries in week_entries:
+            entries.sort(key=lambda entry: (entry[0], entry[1]))
         
-        return date_event_positions
+        return week_entries, next_position
+    
+    def _svg_cache_key(self, csv_file, today_date):
+        """生成済みSVGのキャッシュキーを作成（CSVが存在しない場合はNone）"""
+        try:
+            stat = os.stat(csv_file)
+        except OSError:
+            return None
+        # セルの高さは前回の生成結果を引き継ぐので、キーに含める
+        return (csv_file, stat.st_mtime_ns, stat.st_size, today_date, self.cell_height)
     
     def generate_svg(self, output_file="calendar.svg", today=None, csv_file="vacation.csv"):
         """4週間のカレンダーSVGを生成"""
+        weeks, today_date = self.get_four_week_range(today)
+        
+        # 基準日とCSVファイルが前回と同じなら生成済みのSVGを再利用
+        cache_key = self._svg_cache_key(csv_file, today_date)
+        cached = self._svg_cache.pop(cache_key, None)
+        if cached is not None:
+            self._svg_cache[cache_key] = cached  # 最近使ったものとして末尾に移動
+            svg_bytes, self.events, member_colors, self.cell_height = cached
+            self.index_events()
+            self.member_colors = dict(member_colors)
+            self._write_if_changed(output_file, svg_bytes)
+            return output_file
+        
         # CSVファイルから予定を読み込み
         self.load_events_from_csv(csv_file)
-        weeks, today_date = self.get_four_week_range(today)
         
         # 予定のレイアウトを計算
-        date_event_positions = self.calculate_event_layout(weeks)
+        week_entries, max_events = self.calculate_event_layout(weeks)
         
         # 最大配置位置を計算してセルの高さを調整
-        max_events = max([len(positions) for positions in date_event_positions.values()] + [0])
         if max_events > 0:
             self.cell_height = max(120, 60 + max_events * (self.event_height + 2))
         
-        # SVGの全体サイズを計算
-        total_width = 7 * self.cell_width + 2 * self.margin
-        total_height = self.header_height + 4 * self.cell_height + 2 * self.margin  # ヘッダー行 + 4週間
+        ys, y_day_text = self._start_svg()
+        xs = self._xs
+        event_tmpl = self._EVENT_TMPL
         
-        svg_content = f'''<?xml version="1.0" encoding="UTF-8"?>
-<svg width="{total_width}" height="{total_height}" xmlns="http://www.w3.org/2000/svg">
-    <defs>
-        <style>
-            .header {{ font-family: Arial, sans-serif; font-size: 16px; font-weight: bold; text-anchor: middle; }}
-            .date {{ font-family: Arial, sans-serif; font-size: 14px; text-anchor: middle; }}
-            .month {{ font-family: Arial, sans-serif; font-size: 18px; font-weight: bold; text-anchor: start; }}
-            .day-number {{ font-family: Arial, sans-serif; font-size: 14px; text-anchor: end; }}
-            .event {{ font-family: Arial, sans-serif; font-size: 10px; text-anchor: start; }}
-            .event-rect {{ stroke: #666666; stroke-width: 0.5; }}
-            .cell {{ fill: white; stroke: #cccccc; stroke-width: 1; }}
-            .saturday {{ fill: #e3f2fd; }}
-            .sunday {{ fill: #ffebee; }}
-            .today {{ fill: #ffffa8; stroke: #cccccc; stroke-width: 1; }}
-        </style>
-    </defs>
-    
-    <!-- 背景 -->
-    <rect width="{total_width}" height="{total_height}" fill="#fafafa"/>
-'''
-        
-        # 曜日ヘッダーを描画
-        y_offset = self.margin
-        for i, day_name in enumerate(self.week_days):
-            x = self.margin + i * self.cell_width
-            svg_content += f'''
-    <!-- 曜日ヘッダー: {day_name} -->
-    <rect x="{x}" y="{y_offset}" width="{self.cell_width}" height="{self.header_height}" 
-          class="cell" fill="#e0e0e0"/>
-    <text x="{x + self.cell_width//2}" y="{y_offset + self.header_height//2 + 5}" 
-          class="header">{day_name}</text>'''
-        
-        # 先にカレンダーのセルを全て描画
+        # セルと予定の帯を一度の走査で作成（帯はセルの上に重ねるため別々に集めて最後に連結）
+        cell_parts = []
+        event_parts = []
         for week_idx, week in enumerate(weeks):
-            y = self.margin + self.header_height + week_idx * self.cell_height
+            y = ys[week_idx]
+            y_text = y_day_text[week_idx]
             
             for day_idx, date in enumerate(week):
-                x = self.margin + day_idx * self.cell_width
-                
-                # セルのスタイルを決定
-                cell_class = "cell"
-                if date == today_date:
-                    cell_class += " today"
-                elif day_idx == 5:  # 土曜日
-                    cell_class += " saturday"
-                elif day_idx == 6:  # 日曜日
-                    cell_class += " sunday"
+                cell_parts.append(self._cell_fragment(date, day_idx, y, y_text, today_date))
+            
+            # この週の予定の帯を描画
+            for start_day_idx, pos, event, event_length in week_entries[week_idx]:
+                x = xs[start_day_idx]
+                event_width = event_length * self.cell_width - 4
+                event_y = y + 30 + pos * (self.event_height + 2)
                 
-                # 月表示の判定（毎月1日のみ）
-                month_text = ""
-                if date.day == 1:
-                    month_text = f'<text x="{x + 8}" y="{y + 20}" class="month">{date.month}月</text>'
+                # イベントの表示テキスト（開始日または週の初日に表示）
+                if event['description'].strip():  # 説明がある場合
+                    display_text = f"{event['member']}: {event['description'][:15]}"
+                    if len(event['description']) > 15:
+                        display_text += "..."
+                else:  # 説明が空の場合
+                    display_text = event['member']
                 
-                svg_content += f'''
-    <!-- {date.strftime('%Y-%m-%d')} -->
-    <rect x="{x}" y="{y}" width="{self.cell_width}" height="{self.cell_height}" 
-          class="{cell_class}"/>
-    {month_text}
-    <text x="{x + self.cell_width - 8}" y="{y + 20}" 
-          class="day-number">{date.day}</text>'''
-        
-        # カレンダー描画後にイベントの帯を描画
-        for week_idx, week in enumerate(weeks):
-            y = self.margin + self.header_height + week_idx * self.cell_height
-            
-            # この週のイベントを描画
-            drawn_events = set()  # この週ですでに描画したイベントを記録（IDで管理）
-            
-            for day_idx, date in enumerate(week):
-                x = self.margin + day_idx * self.cell_width
+                # テキストがある場合のみテキスト要素を追加
+                text_element = ""
+                if display_text:
+                    text_element = f'<text x="{x + 4}" y="{event_y + 12}" class="event">{display_text.translate(self._xml_tt)}</text>'
                 
-                if date in date_event_positions:
-                    events_on_date = date_event_positions[date]
-                    for pos, event in enumerate(events_on_date):
-                        if event is not None:
-                            event_id = (event['member'], event['start_date'], event['end_date'])
-                            if event_id not in drawn_events:
-                                # イベントがこの日に含まれるか確認
-                                if event['start_date'] <= date <= event['end_date']:
-                                    # この週でのイベント範囲を計算
-                                    week_start = week[0]
-                                    week_end = week[6]
-                                    event_start_in_week = max(event['start_date'], week_start)
-                                    event_end_in_week = min(event['end_date'], week_end)
-                                    
-                                    # イベントがこの週で開始する日のみ連続した帯を描画
-                                    if event_start_in_week == date:
-                                        drawn_events.add(event_id)  # 描画済みとして記録
-                                        
-                                        # 連続した帯の長さを計算
-                                        start_day_idx = event_start_in_week.weekday()
-                                        end_day_idx = event_end_in_week.weekday()
-                                        event_length = end_day_idx - start_day_idx + 1
-                                        
-                                        event_width = event_length * self.cell_width - 4
-                                        event_y = y + 30 + pos * (self.event_height + 2)
-                                        member_color = self.member_colors.get(event['member'], '#f0f0f0')
-                                        
-                                        # イベントの表示テキスト
-                                        if event['start_date'] == date or event_start_in_week == date:
-                                            # イベントの開始日または週の開始日の場合テキストを表示
-                                            if event['description'].strip():  # 説明がある場合
-                                                display_text = f"{event['member']}: {event['description'][:15]}"
-                                                if len(event['description']) > 15:
-                                                    display_text += "..."
-                                            else:  # 説明が空の場合
-                                                display_text = event['member']
-                                        else:
-                                            # 継続部分の場合、テキストなし
-                                            display_text = ""
-                                        
-                                        # テキストがある場合のみテキスト要素を追加
-                                        text_element = ""
-                                        if display_text:
-                                            text_element = f'<text x="{x + 4}" y="{event_y + 12}" class="event">{display_text}</text>'
-                                        
-                                        svg_content += f'''
-    <rect x="{x + 2}" y="{event_y}" width="{event_width}" height="{self.event_height}" 
-          fill="{member_color}" class="event-rect"/>
-    {text_element}'''
+                event_parts.append(event_tmpl.format_map({
+                    'x': x + 2, 'y': event_y, 'w': event_width, 'h': self.event_height,
+                    'c': event['color'], 't': text_element,
+                }))
         
-        svg_content += '''
-</svg>'''
+        buf = self._buf
+        buf += ''.join(cell_parts).encode('utf-8')
+        buf += ''.join(event_parts).encode('utf-8')
+        self._finish_svg(output_file)
         
-        # ファイルに書き込み
-        with open(output_file, 'w', encoding='utf-8') as f:
-            f.write(svg_content)
+        if cache_key is not None:
+            self._svg_cache[cache_key] = (bytes(buf), self.events, dict(self.member_colors), self.cell_height)
+            if len(self._svg_cache) > self._svg_cache_size:
+                del self._svg_cache[next(iter(self._svg_cache))]
         
         return output_file
-    
-    def convert_svg_to_png(self, svg_file):
-        """SVGファイルをPNGに変換（pyvipsを使用）"""
-        png_file = svg_file.replace('.svg', '.png')
-        
-        try:
-            # pyvipsでSVGをPNGに変換
-            image = pyvips.Image.new_from_file(svg_file, dpi=300)
-            image.write_to_file(png_file)
-            print(f"PNG変換成功: {png_file}")
-            return png_file
-            
-        except Exception as e:
-            print(f"pyvips PNG変換エラー: {e}")
-            return None
-    
-    def print_date_info(self, today=None):
-        """デバッグ用：日付情報を表示"""
-        weeks, today_date = self.get_four_week_range(today)
-        print(f"基準日: {today_date}")
-        print(f"4週間の日付範囲:")
-        
-        for week_idx, week in enumerate(weeks):
-            week_type = ["前週", "当週", "次週1", "次週2"][week_idx]
-            print(f"  {week_type}: {week[0]} ～ {week[-1]}")
 
 
 def main():